@@ -1,16 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import Enum
 import json
+import logging
 import os
 import sys
+import threading
 import time
-from typing import Any, Optional, Tuple, TypedDict, List, Literal
+from typing import Any, Callable, Iterator, Optional, Tuple, TypedDict, List, Literal
 import psycopg
-from psycopg import Cursor
+from psycopg import Cursor, sql
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 CLUSTER_CONF_FILE = "/home/pgedge/cluster.json"
 INIT_STATUS_FILE = "/data/init-status.json"
 
+# Ignore any saved init status and initialize everything again
+FORCE_INIT = os.getenv("FORCE_INIT", "false").lower() == "true"
+
+# Notification channel used to announce that a spock node has been created
+SPOCK_NODE_READY_CHANNEL = "spock_node_ready"
+
+# Seconds libpq may spend establishing a connection
+CONNECT_TIMEOUT = 5
+
+# Seconds a pool keeps retrying a connection before starting over
+POOL_RECONNECT_TIMEOUT = 30
+
+# Retry delays grow exponentially from the base delay up to the max delay
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 8
+
 SUPERUSER_PARAMETERS = ", ".join(
     [
         "commit_delay",
@@ -44,6 +70,32 @@ SUPERUSER_PARAMETERS = ", ".join(
     ]
 )
 
+_PG15_SUPERUSER_ROLES = [
+    "pg_read_all_data",
+    "pg_write_all_data",
+    "pg_read_all_settings",
+    "pg_read_all_stats",
+    "pg_stat_scan_tables",
+    "pg_monitor",
+    "pg_signal_backend",
+    "pg_checkpoint",
+]
+
+_PG16_SUPERUSER_ROLES = _PG15_SUPERUSER_ROLES + [
+    "pg_use_reserved_connections",
+    "pg_create_subscription",
+]
+
+# Roles granted to pgedge_superuser, keyed by Postgres major version
+SUPERUSER_ROLES_BY_VERSION = {
+    "15": ", ".join(_PG15_SUPERUSER_ROLES),
+    "16": ", ".join(_PG16_SUPERUSER_ROLES),
+    "17": ", ".join(_PG16_SUPERUSER_ROLES),
+}
+
+PG_VERSION = os.getenv("PGV")
+SUPERUSER_ROLES = SUPERUSER_ROLES_BY_VERSION.get(PG_VERSION)
+
 
 class NodeSpec(TypedDict):
     id: str
@@ -75,11 +127,22 @@ class ClusterSpec(TypedDict):
     databases: List[DatabaseSpec] # Multiple databases supported
 
 
+def load_json(f) -> Any:
+    if orjson:
+        return orjson.loads(f.read())
+    return json.load(f)
+
+def dump_json(obj: Any, f) -> None:
+    if orjson:
+        f.write(orjson.dumps(obj).decode())
+    else:
+        json.dump(obj, f)
+
 def read_config() -> ClusterSpec:
     if not os.path.exists(CLUSTER_CONF_FILE):
         raise FileNotFoundError("spec not found")
     with open(CLUSTER_CONF_FILE) as f:
-        return json.load(f)
+        return load_json(f)
 
 class DatabaseStatus(str, Enum):
     CREATED = "created"      # Database is created but not initialized
@@ -90,51 +153,157 @@ class InitStatus(TypedDict):
     default_db_initialized: bool
     dbs_initialized: dict[str, DatabaseStatus]
 
-def read_init_status():
+def read_init_status() -> InitStatus:
     # Force update from enviroment
-    force_update = os.getenv("FORCE_INIT", "false").lower() == "true"
-    if force_update:
+    if FORCE_INIT:
         info("WARNING: FORCE_INIT is set, forcing init status update")
         return {"default_db_initialized": False, "dbs_initialized": {}}
     if not os.path.exists(INIT_STATUS_FILE):
         return {"default_db_initialized": False, "dbs_initialized": {}}
     with open(INIT_STATUS_FILE) as f:
-        # If not a valid json, return empty
+        # If not a valid json, return empty. orjson.JSONDecodeError is a
+        # subclass of json.JSONDecodeError so this covers both parsers.
         try:
-            return json.load(f)
+            return load_json(f)
         except json.JSONDecodeError:
             return {"default_db_initialized": False, "dbs_initialized": {}}
-    
+
+# In-memory copy of the init status, loaded once and kept in sync with the file
+_STATUS: Optional[InitStatus] = None
+
+def load_init_status() -> InitStatus:
+    global _STATUS
+    if _STATUS is None:
+        _STATUS = read_init_status()
+    return _STATUS
+
+def write_init_status(init_status: InitStatus) -> None:
+    # Write to a temporary file first so a crash can't leave a truncated file
+    tmp_file = INIT_STATUS_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        dump_json(init_status, f)
+    os.replace(tmp_file, INIT_STATUS_FILE)
+
 def update_database_init_status(database_name: str, status: DatabaseStatus) -> None:
-    init_status = read_init_status()
+    init_status = load_init_status()
+    if init_status["dbs_initialized"].get(database_name) == status:
+        return
     init_status["dbs_initialized"][database_name] = status
-    with open(INIT_STATUS_FILE, "w") as f:
-        json.dump(init_status, f)
+    write_init_status(init_status)
 
 def update_default_db_init_status(initialized: bool) -> None:
-    init_status = read_init_status()
+    init_status = load_init_status()
+    if init_status["default_db_initialized"] == initialized:
+        return
     init_status["default_db_initialized"] = initialized
-    with open(INIT_STATUS_FILE, "w") as f:
-        json.dump(init_status, f)
+    write_init_status(init_status)
 
 def info(*args) -> None:
     print("**** pgEdge:", *args, "****")
     sys.stdout.flush()
 
 
-def connect(dsn: str, autocommit: bool = True):
+def backoff(attempt: int) -> float:
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt)
+
+
+def wait_until(pred: Callable[[], bool], timeout: float = 30, interval: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while True:
+        if pred():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+# One pool per (dsn, autocommit) so retries and repeated connects to the same
+# database reuse open sessions instead of redoing the connection handshake.
+_pools: dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str, autocommit: bool = True, max_size: int = 4) -> ConnectionPool:
+    key = (dsn, autocommit)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                dsn,
+                # Connections are only opened on demand, so a pool never
+                # runs a background fill alongside a waiting getconn()
+                min_size=0,
+                max_size=max_size,
+                kwargs={"autocommit": autocommit},
+                # Don't hand out sessions that went stale while idle
+                check=ConnectionPool.check_connection,
+                # Restart the pool's reconnect backoff regularly instead of
+                # letting the delay between attempts grow for minutes
+                reconnect_timeout=POOL_RECONNECT_TIMEOUT,
+                open=True,
+            )
+            _pools[key] = pool
+        elif pool.max_size < max_size:
+            pool.resize(pool.min_size, max_size)
+        return pool
+
+
+def close_pool(dsn: str) -> None:
+    with _pools_lock:
+        pools = [_pools.pop(key) for key in list(_pools) if key[0] == dsn]
+    for pool in pools:
+        pool.close()
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class PoolLogHandler(logging.Handler):
+    # The pool logs why its connection attempts fail (e.g. a wrong password or
+    # a missing database); route that into our own log format.
+    def emit(self, record: logging.LogRecord) -> None:
+        info(record.getMessage())
+
+
+_pool_logger = logging.getLogger("psycopg.pool")
+_pool_logger.addHandler(PoolLogHandler(logging.WARNING))
+_pool_logger.propagate = False
+
+
+@contextmanager
+def connect(dsn: str, autocommit: bool = True) -> Iterator[psycopg.Connection]:
+    pool = get_pool(dsn, autocommit)
+    attempt = 0
     while True:
+        # The pool keeps reconnecting in the background with its own backoff
+        # and logs the cause of each failure, so just keep waiting on it. The
+        # timeout covers at least one full connection attempt.
         try:
-            return psycopg.connect(dsn, autocommit=autocommit)
-        except psycopg.OperationalError as exc:
-            info("unable to connect to database, retrying in 2 sec...", exc)
-            time.sleep(2)
+            conn = pool.getconn(timeout=max(CONNECT_TIMEOUT, backoff(attempt)))
+            break
+        except PoolTimeout:
+            info("unable to connect to database, retrying...")
+            attempt += 1
+    try:
+        # Commits or rolls back on exit but leaves the connection open, since
+        # it belongs to the pool.
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
 
 
 def can_connect(dsn: str) -> bool:
+    # A one-off probe rather than a pooled connection: pooling the init DSN
+    # would hold a session on the database we are about to drop.
     try:
-        psycopg.connect(dsn, connect_timeout=5)
-        return True
+        with psycopg.connect(dsn, connect_timeout=2):
+            return True
     except psycopg.OperationalError:
         return False
 
@@ -151,6 +320,13 @@ def dsn(
         f"dbname={dbname}",
         f"user={user}",
         f"port={port}",
+        # Detect peers that went away silently instead of hanging until the
+        # OS-level TCP timeout, so the retry loops get a chance to run.
+        "keepalives=1",
+        "keepalives_idle=10",
+        "keepalives_interval=5",
+        "keepalives_count=3",
+        f"connect_timeout={CONNECT_TIMEOUT}",
     ]
     if pw:
         fields.append(f"password={pw}")
@@ -159,139 +335,193 @@ def dsn(
 
 
 def wait_for_spock_node(dsn: str):
-    with connect(dsn) as conn:
-        with conn.cursor() as cursor:
-            while True:
+    attempt = 0
+    while True:
+        try:
+            with connect(dsn) as conn:
+                # Nodes announce themselves on this channel once
+                # spock.node_create has committed, so we wake up as soon as
+                # that happens. Listening before the first check means the
+                # announcement can't be missed; the backoff only bounds how
+                # long we wait between checks.
+                conn.execute(sql.SQL("LISTEN {};").format(sql.Identifier(SPOCK_NODE_READY_CHANNEL)))
                 try:
-                    cursor.execute(f"SELECT COUNT(*) FROM spock.node;")
-                    row = cursor.fetchone()
-                    if row[0] > 0:
-                        return
-                except Exception as exc:
-                    info("peer spock.node not configured, retrying in 2 sec...", exc)
-                    time.sleep(2)
+                    with conn.cursor() as cursor:
+                        while True:
+                            try:
+                                cursor.execute("SELECT COUNT(*) FROM spock.node;")
+                                row = cursor.fetchone()
+                                if row[0] > 0:
+                                    return
+                            except psycopg.OperationalError:
+                                raise
+                            except Exception as exc:
+                                info("peer spock.node not configured, retrying...", exc)
+                            for _ in conn.notifies(timeout=backoff(attempt), stop_after=1):
+                                pass
+                            attempt += 1
+                finally:
+                    # Don't hand a listening session back to the pool
+                    if not conn.broken:
+                        conn.execute(sql.SQL("UNLISTEN {};").format(sql.Identifier(SPOCK_NODE_READY_CHANNEL)))
+        except psycopg.OperationalError as exc:
+            # The session dropped. The pool discards broken connections, so
+            # the next round starts over on a fresh one and listens again.
+            info("lost connection to peer, reconnecting...", exc)
+            time.sleep(backoff(attempt))
+            attempt += 1
 
 
 def spock_sub_create(cursor: Cursor, sub_name: str, other_dsn: str):
     forward_origins = "{}"
     replication_sets = "{default, default_insert_only, ddl_sql}"
-    sub_create = f"""
+    sub_create = sql.SQL("""
     SELECT spock.sub_create(
-        subscription_name := '{sub_name}',
-        provider_dsn := '{other_dsn}',
-        replication_sets := '{replication_sets}',
-        forward_origins := '{forward_origins}',
+        subscription_name := {sub_name},
+        provider_dsn := {other_dsn},
+        replication_sets := {replication_sets},
+        forward_origins := {forward_origins},
         synchronize_structure := 'true',
         synchronize_data := 'true',
         apply_delay := '0'
-    );"""
+    );""").format(
+        sub_name=sql.Literal(sub_name),
+        other_dsn=sql.Literal(other_dsn),
+        replication_sets=sql.Literal(replication_sets),
+        forward_origins=sql.Literal(forward_origins),
+    )
     # Retry until it works
+    attempt = 0
     while True:
         try:
             cursor.execute(sub_create)
             return
         except Exception as exc:
             info("waiting for subscription to work...", exc)
-            time.sleep(2)
+            time.sleep(backoff(attempt))
+            attempt += 1
 
 def spock_sub_drop(cursor: Cursor, sub_name: str):
-    sub_drop_if_exists = f"""
+    sub_drop_if_exists = sql.SQL("""
     SELECT spock.sub_drop(
-        subscription_name := '{sub_name}',
+        subscription_name := {sub_name},
         ifexists := 'true'
-    );"""
+    );""").format(sub_name=sql.Literal(sub_name))
 
     # Retry until it works
+    attempt = 0
     while True:
         try:
             cursor.execute(sub_drop_if_exists)
             return
         except Exception as exc:
             info("waiting for subscription to drop...", exc)
-            time.sleep(2)
+            time.sleep(backoff(attempt))
+            attempt += 1
 
 
-def get_admin_creds(postgres_users: dict[str, Any]) -> Tuple[str, str]:
-    for _, user in postgres_users.items():
-        if user.get("service") == "postgres" and user["type"] == "admin":
-            return user["username"], user["password"]
-    return "", ""
+def exec_batch(cur: Cursor, stmts: list[sql.Composable]) -> None:
+    # Pipeline mode queues the statements and sends them to the server in a
+    # single round trip, while still reporting errors per statement. The batch
+    # runs in one transaction, so statements that can't run in a transaction
+    # block (e.g. CREATE/DROP DATABASE) must be executed alone.
+    if not stmts:
+        return
+    conn = cur.connection
+    with conn.pipeline(), conn.transaction():
+        for stmt in stmts:
+            cur.execute(stmt)
+
 
 def get_superuser_roles() -> str:
-    pg_version = os.getenv("PGV")
-    if pg_version == "15":
-        return ", ".join(
-            [
-                "pg_read_all_data",
-                "pg_write_all_data",
-                "pg_read_all_settings",
-                "pg_read_all_stats",
-                "pg_stat_scan_tables",
-                "pg_monitor",
-                "pg_signal_backend",
-                "pg_checkpoint",
-            ]
-        )
-    elif pg_version in ["16", "17"]:
-        return ", ".join(
-            [
-                "pg_read_all_data",
-                "pg_write_all_data",
-                "pg_read_all_settings",
-                "pg_read_all_stats",
-                "pg_stat_scan_tables",
-                "pg_monitor",
-                "pg_signal_backend",
-                "pg_checkpoint",
-                "pg_use_reserved_connections",
-                "pg_create_subscription",
-            ]
-        )
-    else:
-        raise ValueError(f"unrecognized postgres version: '{pg_version}'")
+    if SUPERUSER_ROLES is None:
+        raise ValueError(f"unrecognized postgres version: '{PG_VERSION}'")
+    return SUPERUSER_ROLES
 
 
-def create_user_statement(user: UserSpec) -> list[str]:
-    username = user["username"]
-    password = user["password"]
+def create_user_statement(user: UserSpec) -> list[sql.Composed]:
+    username = sql.Identifier(user["username"])
+    password = sql.Literal(user["password"])
     superuser = user.get("superuser")
     user_type = user.get("type")
 
     if superuser:
-        return [f"CREATE USER {username} WITH LOGIN SUPERUSER PASSWORD '{password}';"]
+        return [
+            sql.SQL("CREATE USER {} WITH LOGIN SUPERUSER PASSWORD {};").format(username, password)
+        ]
     elif user_type in ["admin", "internal_admin"]:
         return [
-            f"CREATE USER {username} WITH LOGIN CREATEROLE CREATEDB PASSWORD '{password}';",
-            f"GRANT pgedge_superuser to {username} WITH ADMIN TRUE;",
+            sql.SQL("CREATE USER {} WITH LOGIN CREATEROLE CREATEDB PASSWORD {};").format(username, password),
+            sql.SQL("GRANT pgedge_superuser to {} WITH ADMIN TRUE;").format(username),
         ]
     else:
-        return [f"CREATE USER {username} WITH LOGIN PASSWORD '{password}';"]
-
-
-def alter_user_statements(user: UserSpec, dbname: str, schemas: list[str]) -> list[str]:
-    name = user["username"]
-    stmts = [f"GRANT CONNECT ON DATABASE {dbname} TO {name};"]
-    if user["type"] in ["application_read_only", "internal_read_only", "pooler_auth"]:
-        for schema in schemas:
-            stmts += [
-                f"GRANT USAGE ON SCHEMA {schema} TO {name};",
-                f"GRANT SELECT ON ALL TABLES IN SCHEMA {schema} TO {name};",
-                f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT SELECT ON TABLES TO {name};",
-            ]
-        if user["type"] == "internal_read_only":
-            stmts.append(f"GRANT EXECUTE ON FUNCTION pg_ls_waldir TO {name};")
-            stmts.append(f"GRANT pg_read_all_stats TO {name};")
-        return stmts
+        return [sql.SQL("CREATE USER {} WITH LOGIN PASSWORD {};").format(username, password)]
+
+
+# Per-schema grants for read-only users
+_READ_ONLY_SCHEMA_TEMPLATES = (
+    sql.SQL("GRANT USAGE ON SCHEMA {schema} TO {name};"),
+    sql.SQL("GRANT SELECT ON ALL TABLES IN SCHEMA {schema} TO {name};"),
+)
+_READ_ONLY_DEFAULT_PRIVILEGES_TEMPLATES = (
+    sql.SQL("{default_privileges} IN SCHEMA {schema} GRANT SELECT ON TABLES TO {name};"),
+)
+
+# Per-schema grants for all other users
+_APP_SCHEMA_TEMPLATES = (
+    sql.SQL("GRANT USAGE, CREATE ON SCHEMA {schema} TO {name};"),
+    sql.SQL("GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA {schema} TO {name};"),
+    sql.SQL("GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA {schema} TO {name};"),
+)
+_APP_DEFAULT_PRIVILEGES_TEMPLATES = (
+    sql.SQL("{default_privileges} IN SCHEMA {schema} GRANT ALL PRIVILEGES ON TABLES TO {name};"),
+    sql.SQL("{default_privileges} IN SCHEMA {schema} GRANT ALL PRIVILEGES ON SEQUENCES TO {name};"),
+)
+
+
+def is_read_only_user(user: UserSpec) -> bool:
+    return user["type"] in ["application_read_only", "internal_read_only", "pooler_auth"]
+
+
+def default_privileges_statements(
+    user: UserSpec, schemas: list[str], grantor: Optional[str] = None
+) -> list[sql.Composed]:
+    name = sql.Identifier(user["username"])
+    # Default privileges only apply to objects created by the role they are
+    # set for, which is the current role unless a grantor is given.
+    default_privileges = sql.SQL("ALTER DEFAULT PRIVILEGES")
+    if grantor:
+        default_privileges = sql.SQL("ALTER DEFAULT PRIVILEGES FOR ROLE {}").format(
+            sql.Identifier(grantor)
+        )
+    if is_read_only_user(user):
+        templates = _READ_ONLY_DEFAULT_PRIVILEGES_TEMPLATES
     else:
-        for schema in schemas:
-            stmts += [
-                f"GRANT USAGE, CREATE ON SCHEMA {schema} TO {name};",
-                f"GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA {schema} TO {name};",
-                f"GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA {schema} TO {name};",
-                f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT ALL PRIVILEGES ON TABLES TO {name};",
-                f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT ALL PRIVILEGES ON SEQUENCES TO {name};",
-            ]
-        return stmts
+        templates = _APP_DEFAULT_PRIVILEGES_TEMPLATES
+    return [
+        template.format(default_privileges=default_privileges, schema=schema, name=name)
+        for schema in map(sql.Identifier, schemas)
+        for template in templates
+    ]
+
+
+def alter_user_statements(user: UserSpec, dbname: str, schemas: list[str]) -> list[sql.Composed]:
+    name = sql.Identifier(user["username"])
+    stmts = [sql.SQL("GRANT CONNECT ON DATABASE {} TO {};").format(sql.Identifier(dbname), name)]
+    if is_read_only_user(user):
+        templates = _READ_ONLY_SCHEMA_TEMPLATES
+    else:
+        templates = _APP_SCHEMA_TEMPLATES
+    stmts.extend(
+        template.format(schema=schema, name=name)
+        for schema in map(sql.Identifier, schemas)
+        for template in templates
+    )
+    stmts.extend(default_privileges_statements(user, schemas))
+    if user["type"] == "internal_read_only":
+        stmts.append(sql.SQL("GRANT EXECUTE ON FUNCTION pg_ls_waldir TO {};").format(name))
+        stmts.append(sql.SQL("GRANT pg_read_all_stats TO {};").format(name))
+    return stmts
 
 
 def get_self_node(spec: ClusterSpec) -> NodeSpec:
@@ -320,6 +550,7 @@ def get_hostname(node: NodeSpec) -> str:
 class DatabaseInfo:
     database_name: str
     owner: str
+    admin_username: str
     hostname: str
     mode: Optional[str]
     nodes: list[NodeSpec]
@@ -335,7 +566,25 @@ class DatabaseInfo:
     pgedge_pw: str
 
 
-def get_default_db_info(spec: ClusterSpec) -> DatabaseInfo:
+@dataclass
+class SpecContext:
+    default_db_name: str
+    databases: list[DatabaseSpec]
+    nodes: list[NodeSpec]
+    hostname: str
+    node_name: str
+    node_id: str
+    postgres_users: dict[str, Any]
+    pgedge_pw: str
+    admin_username: str
+    admin_password: str
+    init_dsn: str
+    init_dbname: Optional[str]
+    init_username: Optional[str]
+    mode: str
+
+
+def build_context(spec: ClusterSpec) -> SpecContext:
     default_db_name = spec.get("name")
     if not default_db_name:
         info("ERROR: default database name not found in spec")
@@ -356,9 +605,16 @@ def get_default_db_info(spec: ClusterSpec) -> DatabaseInfo:
     hostname = get_hostname(self_node)
     node_name = self_node["name"]
     node_id = self_node["id"]
-    postgres_users = dict(
-        (user["username"], user) for user in users if user["service"] == "postgres"
-    )
+
+    # Collect the postgres users and find the admin user in a single pass
+    postgres_users: dict[str, Any] = {}
+    admin_user: Optional[UserSpec] = None
+    for user in users:
+        if user["service"] != "postgres":
+            continue
+        postgres_users[user["username"]] = user
+        if user["type"] == "admin" and user["username"] != "pgedge" and admin_user is None:
+            admin_user = user
 
     # Get the pgedge password and remove the user from the dict.
     # This user already exists so we don't need to create it later.
@@ -368,147 +624,129 @@ def get_default_db_info(spec: ClusterSpec) -> DatabaseInfo:
     if not pgedge_pw:
         info("ERROR: pgedge user configuration not found in spec")
         sys.exit(1)
-    admin_username, admin_password = get_admin_creds(postgres_users)
+    admin_username = admin_user["username"] if admin_user else ""
+    admin_password = admin_user["password"] if admin_user else ""
     if not admin_username or not admin_password:
         info("ERROR: admin user configuration not found in spec")
         sys.exit(1)
 
-    # This DSN will be used for Spock subscriptions
-    spock_dsn = dsn(dbname=default_db_name, user="pgedge", host=hostname, pw=pgedge_pw)
-
-    # This DSN will be used for the admin connection
-    local_dsn = dsn(dbname=default_db_name, user=admin_username, pw=admin_password)
-
-    # This DSN will be used to the internal admin connection
-    internal_dsn = dsn(dbname=default_db_name, user="pgedge", pw=pgedge_pw)
-
     # This DSN will be used to the internal admin connection
     init_dbname = os.getenv("INIT_DATABASE")
     init_username = os.getenv("INIT_USERNAME")
     init_password = os.getenv("INIT_PASSWORD")
     init_dsn = dsn(dbname=init_dbname, user=init_username, pw=init_password)
 
-    # Deployment mode
-    mode = spec.get("mode", "online")
-
-    return DatabaseInfo(
-        database_name=default_db_name,
-        owner=admin_username,
+    return SpecContext(
+        default_db_name=default_db_name,
+        databases=spec.get("databases") or [],
         nodes=nodes,
         hostname=hostname,
         node_name=node_name,
         node_id=node_id,
         postgres_users=postgres_users,
-        spock_dsn=spock_dsn,
-        local_dsn=local_dsn,
-        internal_dsn=internal_dsn,
+        pgedge_pw=pgedge_pw,
+        admin_username=admin_username,
+        admin_password=admin_password,
         init_dsn=init_dsn,
         init_dbname=init_dbname,
         init_username=init_username,
-        pgedge_pw=pgedge_pw,
-        mode=mode,
+        # Deployment mode
+        mode=spec.get("mode", "online"),
     )
 
-def get_dbs_info(spec: ClusterSpec) -> list[DatabaseInfo]:
 
-    default_db_name = spec.get("name")
-    if not default_db_name:
-        info("ERROR: default database name not found in spec")
-        sys.exit(1)
+def get_default_db_info(ctx: SpecContext) -> DatabaseInfo:
+    default_db_name = ctx.default_db_name
 
-    databases = spec.get("databases")
-    if not databases:
-        info("WARNING: databases not found in spec, skipping other database initialization")
-        return []
-    
-    # Get shared info
-    nodes = spec.get("nodes")
-    if not nodes:
-        info("ERROR: nodes not found in spec")
-        sys.exit(1)
+    # This DSN will be used for Spock subscriptions
+    spock_dsn = dsn(dbname=default_db_name, user="pgedge", host=ctx.hostname, pw=ctx.pgedge_pw)
 
-    users = spec.get("users")
-    if not users:
-        info("ERROR: users not found in spec")
-        sys.exit(1)
+    # This DSN will be used for the admin connection
+    local_dsn = dsn(dbname=default_db_name, user=ctx.admin_username, pw=ctx.admin_password)
 
-    # Extract details of this node from the spec
-    self_node = get_self_node(spec)
-    hostname = get_hostname(self_node)
-    node_name = self_node["name"]
-    node_id = self_node["id"]
-    postgres_users = dict(
-        (user["username"], user) for user in users if user["service"] == "postgres"
-    )
+    # This DSN will be used to the internal admin connection
+    internal_dsn = dsn(dbname=default_db_name, user="pgedge", pw=ctx.pgedge_pw)
 
-    pgedge_pw = postgres_users.pop("pgedge", {}).get(
-        "password", os.getenv("INIT_PASSWORD")
+    return DatabaseInfo(
+        database_name=default_db_name,
+        owner=ctx.admin_username,
+        admin_username=ctx.admin_username,
+        nodes=ctx.nodes,
+        hostname=ctx.hostname,
+        node_name=ctx.node_name,
+        node_id=ctx.node_id,
+        postgres_users=ctx.postgres_users,
+        spock_dsn=spock_dsn,
+        local_dsn=local_dsn,
+        internal_dsn=internal_dsn,
+        init_dsn=ctx.init_dsn,
+        init_dbname=ctx.init_dbname,
+        init_username=ctx.init_username,
+        pgedge_pw=ctx.pgedge_pw,
+        mode=ctx.mode,
     )
-    if not pgedge_pw:
-        info("ERROR: pgedge user configuration not found in spec")
-        sys.exit(1)
-    admin_username, admin_password = get_admin_creds(postgres_users)
-    if not admin_username or not admin_password:
-        info("ERROR: admin user configuration not found in spec")
-        sys.exit(1)
+
+def get_dbs_info(ctx: SpecContext) -> list[DatabaseInfo]:
+    if not ctx.databases:
+        info("WARNING: databases not found in spec, skipping other database initialization")
+        return []
 
     # This DSN will be used to the internal admin connection
-    init_dbname = os.getenv("INIT_DATABASE")
-    init_username = os.getenv("INIT_USERNAME")
-    init_password = os.getenv("INIT_PASSWORD")
-    init_dsn = dsn(dbname=init_dbname, user=init_username, pw=init_password)
-    
-    # Deployment mode
-    mode = spec.get("mode", "online")
+    internal_dsn = dsn(dbname=ctx.default_db_name, user="pgedge", pw=ctx.pgedge_pw)
 
-    
     dbs_info = []
-    for db in databases:
+    for db in ctx.databases:
         db_name = db.get("name")
         db_owner = db.get("owner")
         if not db_owner:
-            db_owner = admin_username
+            db_owner = ctx.admin_username
         
         # This DSN will be used for Spock subscriptions
-        spock_dsn = dsn(dbname=db_name, user="pgedge", host=hostname, pw=pgedge_pw)
+        spock_dsn = dsn(dbname=db_name, user="pgedge", host=ctx.hostname, pw=ctx.pgedge_pw)
 
         # This DSN will be used for the admin connection
-        local_dsn = dsn(dbname=db_name, user=admin_username, pw=admin_password)
-
-        # This DSN will be used to the internal admin connection
-        internal_dsn = dsn(dbname=default_db_name, user="pgedge", pw=pgedge_pw)
+        local_dsn = dsn(dbname=db_name, user=ctx.admin_username, pw=ctx.admin_password)
 
         db_info = DatabaseInfo(
             database_name=db_name,
             owner=db_owner,
-            nodes=nodes,
-            hostname=hostname,
-            node_name=node_name,
-            node_id=node_id,
-            postgres_users=postgres_users,
+            admin_username=ctx.admin_username,
+            nodes=ctx.nodes,
+            hostname=ctx.hostname,
+            node_name=ctx.node_name,
+            node_id=ctx.node_id,
+            postgres_users=ctx.postgres_users,
             spock_dsn=spock_dsn,
             local_dsn=local_dsn,
             internal_dsn=internal_dsn,
-            pgedge_pw=pgedge_pw,
-            mode=mode,
+            pgedge_pw=ctx.pgedge_pw,
+            mode=ctx.mode,
             # Dummy init_dsn
-            init_dsn=init_dsn,
-            init_dbname=init_dbname,
-            init_username=init_username,
+            init_dsn=ctx.init_dsn,
+            init_dbname=ctx.init_dbname,
+            init_username=ctx.init_username,
         )
 
         dbs_info.append(db_info)
     return dbs_info
 
 
+def close_db_pools(db_info: DatabaseInfo) -> None:
+    # Only the internal pool is shared between databases; the rest would
+    # otherwise hold idle sessions until the end of the run.
+    close_pool(db_info.spock_dsn)
+    close_pool(db_info.local_dsn)
+
+
 def init_default_database(db_info: DatabaseInfo) -> None:
-    init_status = read_init_status()
+    init_status = load_init_status()
     default_db_initialized = init_status["default_db_initialized"]
     if default_db_initialized:
         info("default database already initialized, skipping")
         return
 
-    admin_username = db_info.owner
+    admin_username = sql.Identifier(db_info.owner)
+    database_name = sql.Identifier(db_info.database_name)
 
     # Bootstrap users and the primary database by connecting to the "init"
     # database which is built into the Docker image
@@ -518,35 +756,36 @@ def init_default_database(db_info: DatabaseInfo) -> None:
             sys.exit(1)
         with conn.cursor() as cur:
             cur.execute("SET log_statement = 'none';")
+            # The role and parameter lists are trusted constants
             stmts = [
-                f"CREATE ROLE pgedge_superuser WITH NOLOGIN;",
-                f"GRANT {get_superuser_roles()} TO pgedge_superuser WITH ADMIN true;",
-                f"GRANT SET ON PARAMETER {SUPERUSER_PARAMETERS} TO pgedge_superuser;",
+                sql.SQL("CREATE ROLE pgedge_superuser WITH NOLOGIN;"),
+                sql.SQL("GRANT {} TO pgedge_superuser WITH ADMIN true;").format(sql.SQL(get_superuser_roles())),
+                sql.SQL("GRANT SET ON PARAMETER {} TO pgedge_superuser;").format(sql.SQL(SUPERUSER_PARAMETERS)),
             ]
             for user in db_info.postgres_users.values():
                 stmts.extend(create_user_statement(user))
-            stmts += [
-                f"CREATE DATABASE {db_info.database_name} OWNER {admin_username};",
-                f"GRANT ALL PRIVILEGES ON DATABASE {db_info.database_name} TO {admin_username};",
-                f"GRANT ALL PRIVILEGES ON DATABASE {db_info.init_dbname} TO {admin_username};",
-                f"GRANT ALL PRIVILEGES ON DATABASE {db_info.database_name} TO pgedge;",
-                f"ALTER USER pgedge WITH PASSWORD '{db_info.pgedge_pw}' LOGIN SUPERUSER REPLICATION;",
-            ]
-            for statement in stmts:
-                cur.execute(statement)
+            exec_batch(cur, stmts)
+            cur.execute(sql.SQL("CREATE DATABASE {} OWNER {};").format(database_name, admin_username))
+            exec_batch(cur, [
+                sql.SQL("GRANT ALL PRIVILEGES ON DATABASE {} TO {};").format(database_name, admin_username),
+                sql.SQL("GRANT ALL PRIVILEGES ON DATABASE {} TO {};").format(sql.Identifier(db_info.init_dbname), admin_username),
+                sql.SQL("GRANT ALL PRIVILEGES ON DATABASE {} TO pgedge;").format(database_name),
+                sql.SQL("ALTER USER pgedge WITH PASSWORD {} LOGIN SUPERUSER REPLICATION;").format(sql.Literal(db_info.pgedge_pw)),
+            ])
 
     info("successfully bootstrapped database users")
 
-    # Drop the init database and user
+    # The init database can't be dropped while the pool holds a session on it
+    close_pool(db_info.init_dsn)
+
+    # Drop the init database and user. This has to happen from another
+    # database, but the pooled internal connection is reused by init_database
+    # later on. DROP DATABASE can't run in a pipeline or transaction, so these
+    # are sent separately, and there are no secrets to hide from the log.
     with connect(db_info.internal_dsn) as conn:
         with conn.cursor() as cur:
-            cur.execute("SET log_statement = 'none';")
-            stmts = [
-                f"DROP DATABASE {db_info.init_dbname};",
-                f"DROP USER {db_info.init_username};",
-            ]
-            for statement in stmts:
-                cur.execute(statement)
+            cur.execute(sql.SQL("DROP DATABASE {};").format(sql.Identifier(db_info.init_dbname)))
+            cur.execute(sql.SQL("DROP USER {};").format(sql.Identifier(db_info.init_username)))
 
     info("successfully dropped init database")
 
@@ -554,11 +793,6 @@ def init_default_database(db_info: DatabaseInfo) -> None:
 
     init_spock_node(db_info, schemas)
 
-    # Give the other nodes a couple seconds to reach this point as well. The
-    # below code will retry but doing this means fewer errored attempts in the
-    # log file. Other nodes should be able to connect to us at this point.
-    time.sleep(5)
-
     # Wait for each peer to come online and then subscribe to it
     subscribed = init_peer_spock_subscriptions(db_info, True)
     if not subscribed:
@@ -567,38 +801,33 @@ def init_default_database(db_info: DatabaseInfo) -> None:
         info(f"default database initialized ({db_info.node_name})")
         update_default_db_init_status(True)
 
+    close_db_pools(db_info)
+
 def init_database(db_info: DatabaseInfo) -> None:
-    init_status = read_init_status()
+    init_status = load_init_status()
     current_status = init_status["dbs_initialized"].get(db_info.database_name)
     if current_status is not None:
         info(f"database {db_info.database_name} already fully initialized, skipping")
         return
 
-    # Check if database exists and create if it doesn't
+    # Create the database unless it already exists. CREATE DATABASE can't run
+    # inside a DO block, so just try it and treat a duplicate as success.
     with connect(db_info.internal_dsn) as conn:
         with conn.cursor() as cur:
             cur.execute("SET log_statement = 'none';")
-            # Check if database exists
-            cur.execute(
-                "SELECT 1 FROM pg_database WHERE datname = %s",
-                (db_info.database_name,)
-            )
-            db_exists = cur.fetchone() is not None
-            
-            if not db_exists:
-                # Create the database if it doesn't exist
-                cur.execute(f"CREATE DATABASE {db_info.database_name} OWNER {db_info.owner};")
+            database_name = sql.Identifier(db_info.database_name)
+            owner = sql.Identifier(db_info.owner)
+            try:
+                cur.execute(sql.SQL("CREATE DATABASE {} OWNER {};").format(database_name, owner))
                 info(f"created database {db_info.database_name}")
-            else:
+            except psycopg.errors.DuplicateDatabase:
                 info(f"database {db_info.database_name} already exists")
             
             # Grant permissions regardless of whether we just created the database
-            stmts = [
-                f"GRANT ALL PRIVILEGES ON DATABASE {db_info.database_name} TO {db_info.owner};",
-                f"GRANT ALL PRIVILEGES ON DATABASE {db_info.database_name} TO pgedge;",
-            ]
-            for statement in stmts:
-                cur.execute(statement)
+            exec_batch(cur, [
+                sql.SQL("GRANT ALL PRIVILEGES ON DATABASE {} TO {};").format(database_name, owner),
+                sql.SQL("GRANT ALL PRIVILEGES ON DATABASE {} TO pgedge;").format(database_name),
+            ])
     
     update_database_init_status(db_info.database_name, DatabaseStatus.CREATED)
     info(f"successfully configured database {db_info.database_name}")
@@ -609,70 +838,74 @@ def init_peer_spock_subscriptions(db_info: DatabaseInfo, drop_existing: bool = F
     if len(peers) == 0:
         info(f"no peers found for database {db_info.database_name}, skipping peer spock subscriptions")
         return False
-    with connect(db_info.local_dsn, autocommit=False) as conn:
+    # Peers are independent of each other, so wait for and subscribe to all of
+    # them concurrently rather than paying each peer's start-up time in turn.
+    # Every worker holds a local connection, so make room for all of them.
+    get_pool(db_info.local_dsn, max_size=len(peers))
+    with ThreadPoolExecutor(max_workers=len(peers)) as executor:
+        futures = [
+            executor.submit(init_peer_spock_subscription, db_info, peer, drop_existing)
+            for peer in peers
+        ]
+        for future in futures:
+            future.result()
+    return True
+
+def init_peer_spock_subscription(db_info: DatabaseInfo, peer: NodeSpec, drop_existing: bool) -> None:
+    info("waiting for peer:", peer["name"])
+    peer_dsn = dsn(
+        dbname=db_info.database_name,
+        user="pgedge",
+        host=get_hostname(peer),
+    )
+    sub_name = f"sub_{db_info.database_name}_{db_info.node_name}_{peer['name']}"
+    wait_for_spock_node(peer_dsn)
+    # The peer DSN is only used for this wait, don't keep a session open on it
+    close_pool(peer_dsn)
+    # Each peer gets its own connection. Autocommit lets the retry loops below
+    # carry on after a failed attempt instead of hitting an aborted transaction.
+    with connect(db_info.local_dsn) as conn:
         with conn.cursor() as cur:
-            for peer in peers:
-                info("waiting for peer:", peer["name"])
-                peer_dsn = dsn(
-                    dbname=db_info.database_name,
-                    user="pgedge",
-                    host=get_hostname(peer),
-                )
-                sub_name = f"sub_{db_info.database_name}_{db_info.node_name}_{peer['name']}"
-                wait_for_spock_node(peer_dsn)
-                if drop_existing:
-                    spock_sub_drop(cur, sub_name)
-                time.sleep(2)
-                spock_sub_create(
-                    cur, sub_name, peer_dsn
-                )
-                info("subscribed to peer:", peer["name"])
-            return True
-    return False
+            if drop_existing:
+                spock_sub_drop(cur, sub_name)
+            spock_sub_create(
+                cur, sub_name, peer_dsn
+            )
+    info("subscribed to peer:", peer["name"])
+
 def init_spock_node(db_info: DatabaseInfo, schemas: list[str]) -> None:
 
     with connect(db_info.spock_dsn, autocommit=False) as conn:
         with conn.cursor() as cur:
             cur.execute("SET log_statement = 'none';")
             stmts = [
-                f"CREATE EXTENSION IF NOT EXISTS spock;",
-                f"CREATE EXTENSION IF NOT EXISTS snowflake;",
-                f"CREATE EXTENSION IF NOT EXISTS pg_stat_statements;",
+                sql.SQL("CREATE EXTENSION IF NOT EXISTS spock;"),
+                sql.SQL("CREATE EXTENSION IF NOT EXISTS snowflake;"),
+                sql.SQL("CREATE EXTENSION IF NOT EXISTS pg_stat_statements;"),
             ]
             if "pgcat_auth" in db_info.postgres_users:
                 # supports auth_query from pgcat
-                stmts.append(f"GRANT SELECT ON pg_shadow TO pgcat_auth;")
+                stmts.append(sql.SQL("GRANT SELECT ON pg_shadow TO pgcat_auth;"))
             for user in db_info.postgres_users.values():
                 stmts.extend(
                     alter_user_statements(user, db_info.database_name, schemas)
                 )
-            stmts.append(
-                f"SELECT spock.node_create(node_name := '{db_info.node_name}', dsn := '{db_info.spock_dsn}') WHERE '{db_info.node_name}' NOT IN (SELECT node_name FROM spock.node);"
-            )
-            for statement in stmts:
-                cur.execute(statement)
-
-    with connect(db_info.local_dsn) as conn:
-        with conn.cursor() as cur:
-            cur.execute("SET log_statement = 'none';")
-            stmts = []
-            for user in db_info.postgres_users.values():
-                stmts.extend(
-                    alter_user_statements(user, db_info.database_name, ["public"])
-                )
-            for statement in stmts:
-                cur.execute(statement)
-
-    with connect(db_info.spock_dsn, autocommit=False) as conn:
-        with conn.cursor() as cur:
-            cur.execute("SET log_statement = 'none';")
-            stmts = []
-            for user in db_info.postgres_users.values():
+                # Also cover tables the admin user creates in the public schema
                 stmts.extend(
-                    alter_user_statements(user, db_info.database_name, schemas)
+                    default_privileges_statements(
+                        user, ["public"], grantor=db_info.admin_username
+                    )
                 )
-            for statement in stmts:
-                cur.execute(statement)
+            stmts.append(
+                sql.SQL(
+                    "SELECT spock.node_create(node_name := {node_name}, dsn := {dsn}) WHERE {node_name} NOT IN (SELECT node_name FROM spock.node);"
+                ).format(node_name=sql.Literal(db_info.node_name), dsn=sql.Literal(db_info.spock_dsn))
+            )
+            # Wake up peers waiting on this node, delivered when the batch commits
+            stmts.append(
+                sql.SQL("NOTIFY {};").format(sql.Identifier(SPOCK_NODE_READY_CHANNEL))
+            )
+            exec_batch(cur, stmts)
 
 
 def main() -> None:
@@ -684,15 +917,20 @@ def main() -> None:
         sys.exit(1)
 
     # Parse the spec so we can pass it around
-    default_db_info = get_default_db_info(spec)
+    ctx = build_context(spec)
+    default_db_info = get_default_db_info(ctx)
 
     if default_db_info.mode == "offline":
         info("mode offline configured, postgres will not start")
         while True:
             time.sleep(1)
     else:
-        # Give Postgres a moment to start
-        time.sleep(3)
+        # Wait for Postgres to start accepting connections
+        started = wait_until(
+            lambda: can_connect(default_db_info.local_dsn) or can_connect(default_db_info.init_dsn)
+        )
+        if not started:
+            info("WARNING: postgres is not accepting connections yet, continuing anyway")
 
         initialized = not can_connect(default_db_info.init_dsn) and can_connect(default_db_info.local_dsn)
 
@@ -702,32 +940,26 @@ def main() -> None:
             info("initializing database node...")
             init_default_database(default_db_info)
     
-    # Initialize the other databases
-    dbs_info = get_dbs_info(spec)
-    for db_info in dbs_info:
-        init_database(db_info)
-    
-    # Init spock node for all databases
+    # Initialize the other databases, taking each one through every remaining
+    # init step before moving on to the next
+    dbs_info = get_dbs_info(ctx)
     schemas = ["public", "spock", "pg_catalog", "information_schema"]
+    init_status = load_init_status()
     for db_info in dbs_info:
-        init_status = read_init_status()
         current_status = init_status["dbs_initialized"].get(db_info.database_name)
-        if current_status is None: 
-            info(f"database {db_info.database_name} not initialized, something went wrong! Please restart the node.")
-            sys.exit(1)
-        elif current_status == DatabaseStatus.CREATED:
+        if current_status is None:
+            init_database(db_info)
+            current_status = DatabaseStatus.CREATED
+
+        if current_status == DatabaseStatus.CREATED:
             info(f"database {db_info.database_name} created, initializing spock node")
             init_spock_node(db_info, schemas)
             update_database_init_status(db_info.database_name, DatabaseStatus.INITED)
-            time.sleep(5)
             info(f"spock node of {db_info.database_name} initialized.")
+            current_status = DatabaseStatus.INITED
         else:
             info(f"database spock node {db_info.database_name} already initialized, skipping")
 
-    # Init peer subscriptions for all databases
-    for db_info in dbs_info:
-        init_status = read_init_status()
-        current_status = init_status["dbs_initialized"].get(db_info.database_name)
         if current_status == DatabaseStatus.SUBSCRIBED:
             info(f"database {db_info.database_name} already subscribed to peers, skipping")
         else:
@@ -739,8 +971,10 @@ def main() -> None:
             else:
                 info(f"No need to subscribe to peers for {db_info.database_name}, skipping")
 
-    info(f"cluster node initialized ({db_info.node_name})")
+        close_db_pools(db_info)
 
+    close_pools()
+    info(f"cluster node initialized ({default_db_info.node_name})")
 
 if __name__ == "__main__":
     main()